@@ -1,19 +1,27 @@
-import time
-import json
-import traceback
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import asyncio
+import orjson
+import logging
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from app.services.rag_engine import RAGEngine
-from app.utils.file_handler import save_temp_file, cleanup_uploads
+from app.utils.file_handler import save_temp_file, cleanup_uploads, create_request_dir
 from fastapi.responses import Response
 from jinja2 import Environment, FileSystemLoader
 from xhtml2pdf import pisa
 from io import BytesIO
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 rag_engine = RAGEngine()
 
+# Template is compiled once and reused across /generate-pdf requests
+_JINJA_ENV = Environment(loader=FileSystemLoader("app/templates"), auto_reload=False, cache_size=50)
+_PDF_TEMPLATE = _JINJA_ENV.get_template("pdf_template.html")
+
 @router.post("/auto-fill")
 async def auto_fill(
+    background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(...),
     schema: str = Form(..., alias="schema"),
     event_name: str = Form(...)
@@ -25,38 +33,41 @@ async def auto_fill(
     data structure, fixing the issue where Historical Learnings and Agency 
     Deliverables were not being filled.
     """
+    request_dir = await run_in_threadpool(create_request_dir)
     try:
-        # 1. Save uploaded files and ingest into RAG
-        temp_paths = [save_temp_file(f) for f in files]
-        rag_engine.ingest_documents(temp_paths)
-        data = json.loads(schema)
+        # 1. Save uploaded files and ingest into RAG (loading and indexing run in
+        #    worker threads, so the event loop stays free meanwhile)
+        temp_paths = await asyncio.gather(*[save_temp_file(f, request_dir) for f in files])
+        session = await rag_engine.ingest_documents(temp_paths)
+        data = orjson.loads(schema)
 
         total_fields = 0
         filled_fields = 0
 
-        # 2. Process each section
+        # 2. Collect fields for each section
+        pending_sections = []
         for section_idx, section in enumerate(data["sections"]):
-            print(f"\n{'='*60}")
-            print(f"📝 Processing Section: {section['sectionName']}")
-            print(f"{'='*60}")
             # 3. Collect all fields AND track their exact locations
             fields_to_process = []
             field_locations = []  
             for group_idx, group in enumerate(section["inputFields"]):
+                group_heading = group.get("fieldsHeading")
                 for field_idx, field in enumerate(group["fields"]):
-                    # Generate prompt if missing
-                    if not field.get("prompt"):
-                        # Build prompt from helperText or field name
-                        helper_text = field.get("helperText", [])
-                        field_name = field.get("inputName") or group.get("fieldsHeading") or "Field"
-                        
+                    field_name = field.get("inputName") or group_heading or "Field"
+                    prompt = field.get("prompt")
+
+                    if prompt:
+                        prompt = prompt.replace("{event_name}", event_name)
+                    else:
+                        # Generate prompt from helperText or field name
+                        helper_text = field.get("helperText")
                         if helper_text:
                             # Use helperText to create extraction prompt
-                            combined_text = " ".join(helper_text)
-                            field["prompt"] = f"Extract information about '{field_name}' for event '{{event_name}}': {combined_text}"
+                            combined_text = " ".join(helper_text).replace("{event_name}", event_name)
+                            prompt = f"Extract information about '{field_name}' for event '{event_name}': {combined_text}"
                         else:
                             # Fallback: use field name as prompt
-                            field["prompt"] = f"Extract information about '{field_name}' for event '{{event_name}}'"
+                            prompt = f"Extract information about '{field_name}' for event '{event_name}'"
                     
                     # Store the location for mapping back results
                     field_locations.append({
@@ -66,25 +77,35 @@ async def auto_fill(
                     })
 
                     # Prepare field for processing
-                    field["temp_id_name"] = field.get("inputName") or group.get("fieldsHeading") or "Field"
-                    field["prompt"] = field["prompt"].replace("{event_name}", event_name)
+                    field["temp_id_name"] = field_name
+                    field["prompt"] = prompt
                     fields_to_process.append(field)
 
             if not fields_to_process:
-                print(f"⚠️  No fields to process in {section['sectionName']}")
+                logger.warning("⚠️  No fields to process in %s", section["sectionName"])
                 continue
 
             total_fields += len(fields_to_process)
-            print(f"🔍 Found {len(fields_to_process)} fields to auto-fill")
+            logger.info("🔍 Found %d fields to auto-fill in %s", len(fields_to_process), section["sectionName"])
+            pending_sections.append((section, fields_to_process, field_locations))
+
+        # 4. Extract values for all sections concurrently (LLM calls are bounded
+        #    by the engine's semaphore, so no manual rate-limit sleeps are needed)
+        section_results = await asyncio.gather(
+            *(rag_engine.query_batch(session, section["sectionName"], fields_to_process)
+              for section, fields_to_process, _ in pending_sections),
+            return_exceptions=True
+        )
+
+        # 5. Map extracted values back to the original data structure
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        for (section, fields_to_process, field_locations), extracted_values in zip(pending_sections, section_results):
+            logger.info("📝 Processing Section: %s", section["sectionName"])
 
             try:
-                # 4. Extract values using RAG engine
-                extracted_values = rag_engine.query_batch(
-                    section["sectionName"],
-                    fields_to_process
-                )
+                if isinstance(extracted_values, Exception):
+                    raise extracted_values
 
-                print(f"\n📝 Mapping extracted values back to form...")
                 for i, location in enumerate(field_locations):
                     field = fields_to_process[i]
                     val = extracted_values.get(str(i), "Nil")
@@ -140,15 +161,14 @@ async def auto_fill(
                         # String, Date, Number - assign directly
                         field_ref["inputValue"] = val
 
-                    # Log individual field results
-                    field_name = field.get("inputName", "Unknown")
-                    status = "✓" if val and val != "Nil" else "✗"
-                    display_val = str(val)[:60] if val else "Nil"
-                    print(f"  {status} {field_name}: {display_val}")
+                    # Log individual field results (debug only: runs once per field)
+                    if debug_enabled:
+                        status = "✓" if val and val != "Nil" else "✗"
+                        display_val = str(val)[:60] if val else "Nil"
+                        logger.debug("  %s %s: %s", status, field.get("inputName", "Unknown"), display_val)
 
             except Exception as e:
-                print(f"❌ Error processing section {section['sectionName']}: {e}")
-                traceback.print_exc()
+                logger.exception("❌ Error processing section %s: %s", section["sectionName"], e)
                 # Mark all fields as Nil on error
                 for location in field_locations:
                     section_ref = data["sections"][location["section_idx"]]
@@ -156,19 +176,14 @@ async def auto_fill(
                     field_ref = group_ref["fields"][location["field_idx"]]
                     field_ref["inputValue"] = "Nil"
 
-            # Small delay between sections to avoid rate limiting
-            time.sleep(1)
-
         # 6. Summary
         completion_rate = (filled_fields / total_fields * 100) if total_fields > 0 else 0
-        print(f"\n{'='*60}")
-        print(f"✅ Auto-fill Complete!")
-        print(f"📊 Filled: {filled_fields}/{total_fields} fields ({completion_rate:.1f}%)")
-        print(f"{'='*60}\n")
+        logger.info("✅ Auto-fill Complete! Filled: %d/%d fields (%.1f%%)", filled_fields, total_fields, completion_rate)
 
-        cleanup_uploads()
+        # Remove this request's uploads after the response is sent
+        background_tasks.add_task(cleanup_uploads, request_dir)
 
-        return {
+        payload = {
             "data": data,
             "stats": {
                 "total_fields": total_fields,
@@ -176,10 +191,12 @@ async def auto_fill(
                 "completion_rate": completion_rate
             }
         }
+        # Serialize directly with orjson instead of jsonable_encoder + json.dumps
+        return Response(content=orjson.dumps(payload), media_type="application/json")
 
     except Exception as e:
-        cleanup_uploads()
-        traceback.print_exc()
+        await run_in_threadpool(cleanup_uploads, request_dir)
+        logger.exception("Auto-fill failed")
         raise HTTPException(status_code=500, detail=str(e))
     
 
@@ -188,27 +205,25 @@ async def auto_fill(
 @router.post("/generate-pdf")
 async def generate_pdf(schema: str = Form(...)):
     try:
-        data_json = json.loads(schema)
+        data_json = orjson.loads(schema)
         
         # Prepare helper for top header
-        top_data = {}
-        for section in data_json["sections"]:
-            for group in section["inputFields"]:
-                for field in group["fields"]:
-                    if field.get("inputName"):
-                        top_data[field["inputName"]] = field.get("inputValue")
-
-        # Load Template
-        env = Environment(loader=FileSystemLoader("app/templates"))
-        template = env.get_template("pdf_template.html")
-        html_content = template.render(
+        top_data = {
+            f["inputName"]: f.get("inputValue")
+            for s in data_json["sections"]
+            for g in s["inputFields"]
+            for f in g["fields"]
+            if f.get("inputName")
+        }
+
+        html_content = _PDF_TEMPLATE.render(
             sections=data_json["sections"],
             data=top_data
         )
 
         # Convert HTML to PDF
         pdf_buffer = BytesIO()
-        pisa_status = pisa.CreatePDF(html_content, dest=pdf_buffer)
+        pisa_status = await run_in_threadpool(pisa.CreatePDF, html_content, dest=pdf_buffer)
 
         if pisa_status.err:
             raise HTTPException(status_code=500, detail="PDF Generation Error")
@@ -222,5 +237,5 @@ async def generate_pdf(schema: str = Form(...)):
             }
         )
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("PDF generation failed")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
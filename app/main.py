@@ -1,8 +1,12 @@
+import os
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 load_dotenv()
-from app.api.endpoints import router # Import the endpoints we wrote above
+# App logs are WARNING+ by default; set LOG_LEVEL=INFO (or DEBUG) for progress/field output
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+from app.api.endpoints import router, rag_engine # Import the endpoints we wrote above
 
 
 
@@ -20,6 +24,11 @@ app.add_middleware(
 # Attach the routes from endpoints.py
 app.include_router(router)
 
+@app.on_event("startup")
+def warmup_embeddings():
+    # Run one embedding so the first upload doesn't pay the model warm-up cost
+    rag_engine.embeddings.embed_query("warmup")
+
 @app.get("/")
 def health_check():
     return {"status": "running", "message": "Event AI Backend is online"}
\ No newline at end of file
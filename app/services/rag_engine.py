@@ -1,9 +1,16 @@
+import io
 import os
-import json
 import re
+import asyncio
+import logging
 import time
-from typing import List, Optional, Dict
+import hashlib
+from typing import List, Optional, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import torch
+import orjson
 from dotenv import load_dotenv
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from langchain_groq import ChatGroq
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
@@ -17,6 +24,70 @@ from langchain_community.document_loaders import (
 )
 from langchain_core.documents import Document
 
+CHROMA_PERSIST_DIR = "./chroma_store"
+logger = logging.getLogger(__name__)
+
+# Map section names to JSON keys - EXPANDED MAPPING
+SECTION_MAP = {
+    "project overview": ["project_kickoff", "basic_info", "event_details", "event","project"],
+    "project stakeholders": ["contacts", "stakeholders", "team", "people"],
+    "objectives & audience": ["objectives", "audience", "goals", "targets"],
+    "story & client experience": ["story", "experience", "message", "narrative"],
+    "historical learnings": ["historical_learnings", "historical_context", "previous_year", "history", "learnings"],
+    "agency deliverables": ["agency_deliverables", "agency_requirements", "deliverables", "blue_studio", "must_haves"],
+}
+
+# Max characters of per-field retrieved context per micro-batch; stays under
+# _sanitize_text's 2000-char cap so round-robin selection decides what is kept
+FIELD_CONTEXT_CHARS = 1800
+
+# Bounds on the persistent store: chunks unused for a day are dropped, and the
+# least recently used ones go first once the collection exceeds the cap
+CHROMA_CHUNK_TTL_SECONDS = 24 * 60 * 60
+CHROMA_MAX_CHUNKS = 20000
+
+# Max records per Chroma add()/get() call (stays under the SQLite backend limit)
+CHROMA_ADD_BATCH = 1000
+
+# First fenced JSON object in an LLM reply (```json ... ``` or ``` ... ```)
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+# Punctuation ignored at the end of prompts by the approximate response-cache tier
+_TRAILING_PUNCT = " .?!:;"
+
+# Precompiled tables for _sanitize_text
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7E]+')
+_SANITIZE_TABLE = str.maketrans({
+    '\xa0': ' ',
+    '\u2013': '-',
+    '\u2014': '-',
+    '\u201c': '"',
+    '\u201d': '"',
+    '\u2018': "'",
+    '\u2019': "'",
+})
+
+class IngestSession:
+    """
+    Per-request ingest state. Returned by RAGEngine.ingest_documents and passed
+    back to query_batch, so concurrent requests never share loaded content or caches.
+    """
+
+    def __init__(self):
+        self.processed_files: List[str] = []
+        self.json_content: Optional[Dict] = None  # Store full JSON if available
+        self.index_ready = False  # True once this ingest has indexed chunks
+        # Ids of the chunks this ingest produced; searches are restricted to them
+        self.chunk_ids: List[str] = []
+        self.context_cache: Dict = {}
+        # Rendered JSON context text, keyed by the JSON keys it covers (None = full JSON)
+        self.json_text_cache: Dict[Optional[tuple], str] = {}
+
+    @property
+    def search_filter(self) -> Dict:
+        """Chroma metadata filter limiting similarity search to this ingest's chunks"""
+        return {"chunk_id": {"$in": self.chunk_ids}}
+
 class RAGEngine:
     """
     JSON-optimized RAG Engine with dual-strategy:
@@ -31,7 +102,11 @@ class RAGEngine:
         if not groq_key:
             raise ValueError("GROQ_API_KEY not found in .env file")
 
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = HuggingFaceEmbeddings(
+            model_name="all-MiniLM-L6-v2",
+            model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"},
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
+        )
 
         self.llm = ChatGroq(
             model="openai/gpt-oss-120b",
@@ -40,117 +115,60 @@ class RAGEngine:
             max_retries=3
         )
 
-        self.vector_db = None
-        self.context_cache = {}
-        self.processed_files = []
-        self.json_content = None  # Store full JSON if available
-
-        print("✓ RAG Engine initialized with Groq (GPT-OSS 120B)")
+        # Bounds concurrent LLM calls across all sections/requests (Groq QPS)
+        self.llm_semaphore = asyncio.Semaphore(8)
 
-    def ingest_documents(self, file_paths: List[str]):
-        """Ingest multiple file types with JSON optimization"""
-        all_docs = []
-        self.processed_files = []
-        self.json_content = None
+        # Persistent collection reused across ingests; chunks are keyed by content hash
+        # and searches are filtered to the requesting session's chunk ids
+        self.vector_db = Chroma(
+            persist_directory=CHROMA_PERSIST_DIR,
+            embedding_function=self.embeddings,
+            collection_name="events"
+        )
 
-        print(f"\n📂 Processing {len(file_paths)} file(s)...")
-        print("=" * 60)
+        # Reverse index: section keyword or JSON key alias -> JSON keys to pull
+        self._section_index: Dict[str, List[str]] = {}
+        for section_keyword, json_keys in SECTION_MAP.items():
+            for alias in (section_keyword, *json_keys):
+                self._section_index.setdefault(alias, []).extend(json_keys)
+        # Resolved JSON keys per lowercased section name (section names repeat per batch)
+        self._section_keys_cache: Dict[str, List[str]] = {}
+        # LLM answers keyed by (section, context, label, prompt) hash; see _response_cache_keys
+        self.response_cache: Dict[str, str] = {}
+        self.response_cache_max = 4096
 
-        for path in file_paths:
-            filename = os.path.basename(path)
-            ext = path.lower()
+        logger.info("✓ RAG Engine initialized with Groq (GPT-OSS 120B)")
 
-            try:
-                # PDF Files
-                if ext.endswith('.pdf'):
-                    print(f"📄 Loading PDF: {filename}...", end=" ")
-                    loader = PyPDFLoader(path)
-                    docs = loader.load()
-                    if docs and any(doc.page_content.strip() for doc in docs):
-                        all_docs.extend(docs)
-                        self.processed_files.append(filename)
-                        print(f"✓ ({len(docs)} pages)")
-                    else:
-                        print("⚠ PDF appears to be scanned (no text found)")
-
-                # Word Documents
-                elif ext.endswith('.docx') or ext.endswith('.doc'):
-                    print(f"📝 Loading Word: {filename}...", end=" ")
-                    loader = Docx2txtLoader(path)
-                    docs = loader.load()
-                    all_docs.extend(docs)
-                    self.processed_files.append(filename)
-                    print(f"✓ ({len(docs)} sections)")
-
-                # PowerPoint Presentations
-                elif ext.endswith('.pptx') or ext.endswith('.ppt'):
-                    print(f"📊 Loading PowerPoint: {filename}...", end=" ")
-                    try:
-                        loader = UnstructuredPowerPointLoader(path)
-                        docs = loader.load()
-                        all_docs.extend(docs)
-                        self.processed_files.append(filename)
-                        print(f"✓ ({len(docs)} slides)")
-                    except Exception as ppt_error:
-                        print(f"⚠ PowerPoint error: {str(ppt_error)[:50]}")
-
-                # Text Files
-                elif ext.endswith('.txt'):
-                    print(f"📃 Loading Text: {filename}...", end=" ")
-                    loader = TextLoader(path, encoding='utf-8')
-                    docs = loader.load()
-                    all_docs.extend(docs)
-                    self.processed_files.append(filename)
-                    print(f"✓")
-
-                # JSON Files - SPECIAL HANDLING
-                elif ext.endswith('.json'):
-                    print(f"📖 Loading JSON: {filename}...", end=" ")
-                    try:
-                        with open(path, 'r', encoding='utf-8') as f:
-                            json_data = json.load(f)
-
-                        # Store the full JSON for direct querying
-                        self.json_content = json_data
-
-                        # Also convert to text for vector search (as backup)
-                        text_content = self._json_to_text(json_data)
-                        doc = Document(
-                            page_content=text_content,
-                            metadata={"source": filename, "type": "json"}
-                        )
-                        all_docs.append(doc)
-                        self.processed_files.append(filename)
-                        print(f"✓ (JSON-optimized mode enabled)")
-                    except Exception as json_error:
-                        print(f"⚠ JSON error: {str(json_error)[:50]}")
-
-                # Excel Files
-                elif ext.endswith('.xlsx') or ext.endswith('.xls'):
-                    print(f"📊 Loading Excel: {filename}...", end=" ")
-                    try:
-                        loader = UnstructuredExcelLoader(path, mode="elements")
-                        docs = loader.load()
-                        all_docs.extend(docs)
-                        self.processed_files.append(filename)
-                        print(f"✓ ({len(docs)} sheets)")
-                    except Exception as excel_error:
-                        print(f"⚠ Excel error: {str(excel_error)[:50]}")
+    async def ingest_documents(self, file_paths: List[str]) -> IngestSession:
+        """
+        Ingest multiple file types with JSON optimization.
+        Loading and indexing run in worker threads so the event loop stays free.
+        Returns the session to pass to query_batch.
+        """
+        session = IngestSession()
+        all_docs = []
 
-                else:
-                    print(f"⊘ Skipping unsupported file: {filename}")
+        logger.info("📂 Processing %d file(s)...", len(file_paths))
 
-            except Exception as e:
-                print(f"✗ Error loading {filename}: {str(e)[:50]}")
+        loaded = await asyncio.to_thread(self._load_all, file_paths)
 
-        print("=" * 60)
+        for docs, processed_name, json_data in loaded:
+            all_docs.extend(docs)
+            if processed_name:
+                session.processed_files.append(processed_name)
+            if json_data is not None:
+                session.json_content = json_data
 
         if not all_docs:
-            print("⚠ WARNING: No documents were successfully loaded!")
-            return
+            logger.warning("⚠ No documents were successfully loaded!")
+            return session
+
+        await asyncio.to_thread(self._build_index, session, all_docs)
+        return session
 
+    def _build_index(self, session: IngestSession, all_docs: List[Document]):
+        """Split documents and upsert their chunks into the vector database"""
         # Create vector database
-        print(f"📚 Splitting {len(all_docs)} document(s) into chunks...", end=" ")
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=800,
             chunk_overlap=150,
@@ -158,28 +176,178 @@ class RAGEngine:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
         docs = splitter.split_documents(all_docs)
-        print(f"✓ Created {len(docs)} chunks")
+        logger.info("📚 Split %d document(s) into %d chunks", len(all_docs), len(docs))
 
-        print(f"🔍 Creating vector database...", end=" ")
         if docs:
-            self.vector_db = Chroma.from_documents(docs, self.embeddings)
-            print(f"✓")
-            print(f"\n✅ Successfully processed {len(self.processed_files)} file(s)")
-            print(f"   Files: {', '.join(self.processed_files)}")
-            print(f"   Total chunks indexed: {len(docs)}")
-            if self.json_content:
-                print(f"   🚀 JSON-optimized extraction enabled\n")
+            # Key chunks by content hash so re-uploaded documents are not re-embedded
+            chunks_by_id = {}
+            for d in docs:
+                doc_id = hashlib.blake2b(d.page_content.encode()).hexdigest()[:16]
+                chunks_by_id.setdefault(doc_id, d)
+            all_ids = list(chunks_by_id)
+
+            # Reuse stored embeddings for chunks already in the collection
+            collection = self.vector_db._collection
+            vectors_by_id = {}
+            for start in range(0, len(all_ids), CHROMA_ADD_BATCH):
+                existing = collection.get(ids=all_ids[start:start + CHROMA_ADD_BATCH], include=["embeddings"])
+                existing_vectors = existing["embeddings"]
+                if existing_vectors is None:
+                    continue
+                for chunk_id, vector in zip(existing["ids"], existing_vectors):
+                    vectors_by_id[chunk_id] = [float(x) for x in vector]
+            reused = len(vectors_by_id)
+            new_ids = [i for i in all_ids if i not in vectors_by_id]
+
+            if new_ids:
+                # Embed new chunks in one batched pass
+                new_vectors = self.embeddings.embed_documents([chunks_by_id[i].page_content for i in new_ids])
+                vectors_by_id.update(zip(new_ids, new_vectors))
+
+            # Upsert every chunk of this ingest so concurrent ingests of the same
+            # document don't collide on ids, and refresh last_used for eviction
+            now = time.time()
+            for start in range(0, len(all_ids), CHROMA_ADD_BATCH):
+                ids = all_ids[start:start + CHROMA_ADD_BATCH]
+                collection.upsert(
+                    ids=ids,
+                    documents=[chunks_by_id[i].page_content for i in ids],
+                    embeddings=[vectors_by_id[i] for i in ids],
+                    metadatas=[{**chunks_by_id[i].metadata, "chunk_id": i, "last_used": now} for i in ids]
+                )
+            self._evict_stale_chunks(all_ids)
+
+            session.chunk_ids = all_ids
+            session.index_ready = True
+            logger.info("🔍 Vector database updated (%d new, %d reused chunks)", len(new_ids), reused)
+            logger.info(
+                "✅ Successfully processed %d file(s): %s (%d chunks indexed%s)",
+                len(session.processed_files),
+                ", ".join(session.processed_files),
+                len(docs),
+                ", JSON-optimized extraction enabled" if session.json_content else ""
+            )
+
+    def _evict_stale_chunks(self, keep_ids: List[str]):
+        """
+        Bound the persistent store: drop chunks no ingest has used within
+        CHROMA_CHUNK_TTL_SECONDS, then the least recently used ones beyond
+        CHROMA_MAX_CHUNKS (never the chunks of the ingest in progress).
+        """
+        collection = self.vector_db._collection
+        collection.delete(where={"last_used": {"$lt": time.time() - CHROMA_CHUNK_TTL_SECONDS}})
+
+        excess = collection.count() - CHROMA_MAX_CHUNKS
+        if excess <= 0:
+            return
+        keep = set(keep_ids)
+        records = collection.get(include=["metadatas"])
+        candidates = sorted(
+            ((meta or {}).get("last_used", 0), chunk_id)
+            for chunk_id, meta in zip(records["ids"], records["metadatas"])
+            if chunk_id not in keep
+        )
+        stale_ids = [chunk_id for _, chunk_id in candidates[:excess]]
+        for start in range(0, len(stale_ids), CHROMA_ADD_BATCH):
+            collection.delete(ids=stale_ids[start:start + CHROMA_ADD_BATCH])
+        logger.info("🧹 Evicted %d least recently used chunk(s) from the vector database", len(stale_ids))
+
+    def _load_all(self, file_paths: List[str]) -> List[Tuple[List[Document], Optional[str], Optional[Dict]]]:
+        """Load all files concurrently, returning _load_one results in input order"""
+        if not file_paths:
+            return []
+        # Loaders are independent disk + parse work, so run them concurrently.
+        # executor.map keeps input order, so the last JSON file still wins.
+        with ThreadPoolExecutor(max_workers=min(8, len(file_paths))) as executor:
+            return list(executor.map(self._load_one, file_paths))
+
+    def _load_one(self, path: str) -> Tuple[List[Document], Optional[str], Optional[Dict]]:
+        """
+        Load a single file.
+        Returns (docs, processed filename or None, parsed JSON or None)
+        """
+        filename = os.path.basename(path)
+        ext = path.lower()
+
+        try:
+            # PDF Files
+            if ext.endswith('.pdf'):
+                loader = PyPDFLoader(path)
+                docs = loader.load()
+                if docs and any(doc.page_content.strip() for doc in docs):
+                    logger.info("📄 Loaded PDF: %s (%d pages)", filename, len(docs))
+                    return docs, filename, None
+                logger.warning("⚠ PDF appears to be scanned (no text found): %s", filename)
+
+            # Word Documents
+            elif ext.endswith('.docx') or ext.endswith('.doc'):
+                loader = Docx2txtLoader(path)
+                docs = loader.load()
+                logger.info("📝 Loaded Word: %s (%d sections)", filename, len(docs))
+                return docs, filename, None
+
+            # PowerPoint Presentations
+            elif ext.endswith('.pptx') or ext.endswith('.ppt'):
+                try:
+                    loader = UnstructuredPowerPointLoader(path)
+                    docs = loader.load()
+                    logger.info("📊 Loaded PowerPoint: %s (%d slides)", filename, len(docs))
+                    return docs, filename, None
+                except Exception as ppt_error:
+                    logger.warning("⚠ PowerPoint error in %s: %s", filename, str(ppt_error)[:50])
+
+            # Text Files
+            elif ext.endswith('.txt'):
+                loader = TextLoader(path, encoding='utf-8')
+                docs = loader.load()
+                logger.info("📃 Loaded Text: %s", filename)
+                return docs, filename, None
+
+            # JSON Files - SPECIAL HANDLING
+            elif ext.endswith('.json'):
+                try:
+                    with open(path, 'rb') as f:
+                        json_data = orjson.loads(f.read())
+
+                    # Also convert to text for vector search (as backup)
+                    text_content = self._json_to_text(json_data)
+                    doc = Document(
+                        page_content=text_content,
+                        metadata={"source": filename, "type": "json"}
+                    )
+                    logger.info("📖 Loaded JSON: %s (JSON-optimized mode enabled)", filename)
+                    # Return the full JSON for direct querying
+                    return [doc], filename, json_data
+                except Exception as json_error:
+                    logger.warning("⚠ JSON error in %s: %s", filename, str(json_error)[:50])
+
+            # Excel Files
+            elif ext.endswith('.xlsx') or ext.endswith('.xls'):
+                try:
+                    loader = UnstructuredExcelLoader(path, mode="elements")
+                    docs = loader.load()
+                    logger.info("📊 Loaded Excel: %s (%d sheets)", filename, len(docs))
+                    return docs, filename, None
+                except Exception as excel_error:
+                    logger.warning("⚠ Excel error in %s: %s", filename, str(excel_error)[:50])
+
             else:
-                print()
+                logger.info("⊘ Skipping unsupported file: %s", filename)
 
-    def query_batch(self, section_name: str, fields: List[Dict]) -> Dict[str, str]:
+        except Exception as e:
+            logger.error("✗ Error loading %s: %s", filename, str(e)[:50])
+
+        return [], None, None
+
+    async def query_batch(self, session: IngestSession, section_name: str, fields: List[Dict]) -> Dict[str, str]:
         """
         Smart batch processing:
         - If JSON available: Use full JSON context (more accurate)
         - Otherwise: Use vector search
+        Micro-batches are dispatched concurrently; LLM calls are bounded by llm_semaphore.
         """
-        if not self.vector_db:
-            print("⚠ No documents indexed")
+        if not session.index_ready:
+            logger.warning("⚠ No documents indexed")
             return {str(i): "Nil" for i in range(len(fields))}
 
         results = {}
@@ -190,77 +358,92 @@ class RAGEngine:
         batch_size = 3
         total_batches = (len(fields) + batch_size - 1) // batch_size
 
-        print(f"\n🤖 Extracting {len(fields)} fields in {total_batches} batches...")
-
-        for i in range(0, len(fields), batch_size):
-            batch = fields[i:i + batch_size]
-            batch_num = i // batch_size + 1
-
-            print(f"  Batch {batch_num}/{total_batches}...", end=" ")
-            
-            # Use a local try-except for the micro-batch
-            try:
-                batch_results = self._process_micro_batch(section_name, batch, i)
-                results.update(batch_results)
-                print("✓")
-            except Exception as e:
-                print(f"⚠ Micro-batch {i} failed: {e}. Skipping these fields.")
-                # The fields in 'results' remain "Nil", but the rest of the section continues
+        logger.info("🤖 Extracting %d fields in %d batches...", len(fields), total_batches)
+
+        starts = list(range(0, len(fields), batch_size))
+        batch_outputs = await asyncio.gather(
+            *(self._process_micro_batch(session, section_name, fields[i:i + batch_size], i) for i in starts),
+            return_exceptions=True
+        )
 
-            if i + batch_size < len(fields):
-                time.sleep(0.5)
+        for i, batch_results in zip(starts, batch_outputs):
+            if isinstance(batch_results, Exception):
+                logger.warning("⚠ Micro-batch %d failed: %s. Skipping these fields.", i, batch_results)
+                # The fields in 'results' remain "Nil", but the rest of the section continues
+                continue
+            results.update(batch_results)
 
         # Calculate success rate
         filled = sum(1 for v in results.values() if v and v != "Nil")
         total = len(results)
         success_rate = (filled / total * 100) if total > 0 else 0
 
-        print(f"✅ Extraction complete: {filled}/{total} fields filled ({success_rate:.1f}%)\n")
+        logger.info("✅ Extraction complete: %d/%d fields filled (%.1f%%)", filled, total, success_rate)
 
         return results
 
-    def _process_micro_batch(self, section_name: str, fields: List[Dict], start_idx: int) -> Dict[str, str]:
-        """Process a small batch of fields with localized error handling and defined prompts."""
-        max_retries = 3
-
-        for attempt in range(max_retries):
-            try:
-                # Get context using optimal strategy
-                if self.json_content:
-                    # Strategy 1: Use full JSON (best for structured data)
-                    context = self._get_json_context(section_name)
-                else:
-                    # Strategy 2: Use vector search (for unstructured docs)
-                    context = self._get_smart_context(section_name, fields)
-
-                context = self._sanitize_text(context)
-
-                # Limit context length
-                max_context_chars = 6000  # Increased for JSON
-                if len(context) > max_context_chars:
-                    half = max_context_chars // 2
-                    context = context[:half] + "... [middle content omitted] ..." + context[-half:]
-
-                # Create tasks using the start_idx to maintain unique IDs
-                tasks = []
-                for i, f in enumerate(fields):
-                    # Safer fallback: check if helperText exists and has items
-                    helper_text_list = f.get("helperText", [])
-                    label = f.get("inputName")
-
-                    if not label and len(helper_text_list) > 0:
-                        label = helper_text_list[0]
-
-                    if not label:
-                        label = f.get("temp_id_name", "Narrative Summary")
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=8),
+        retry=retry_if_exception_type(orjson.JSONDecodeError),
+        reraise=True
+    )
+    async def _process_micro_batch(self, session: IngestSession, section_name: str, fields: List[Dict], start_idx: int) -> Dict[str, str]:
+        """
+        Process a small batch of fields with defined prompts.
+        Invalid JSON replies are retried with exponential backoff (rate limits are
+        retried by ChatGroq itself); other errors propagate to query_batch, which
+        leaves the fields as "Nil".
+        """
+        # Get context using optimal strategy
+        if session.json_content:
+            # Strategy 1: Retrieve JSON snippets relevant to each field,
+            # falling back to the mapped JSON section(s)
+            context = await self._get_field_context(session, fields) or self._get_json_context(session, section_name)
+        else:
+            # Strategy 2: Use vector search (for unstructured docs)
+            context = await self._get_smart_context(session, section_name, fields)
+
+        context = self._sanitize_text(context)
+
+        # Create tasks using the start_idx to maintain unique IDs
+        tasks = []
+        for i, f in enumerate(fields):
+            # Safer fallback: check if helperText exists and has items
+            helper_text_list = f.get("helperText", [])
+            label = f.get("inputName")
+
+            if not label and len(helper_text_list) > 0:
+                label = helper_text_list[0]
+
+            if not label:
+                label = f.get("temp_id_name", "Narrative Summary")
+
+            tasks.append({
+                "id": str(start_idx + i),
+                "label": self._sanitize_text(label),
+                "task": self._sanitize_text(f.get("prompt", ""))
+            })
+
+        # Serve repeated (section, context, prompt) combinations from cache
+        context_digest = hashlib.blake2b(context.encode(), digest_size=16).hexdigest()
+        cached_results = {}
+        uncached_tasks = []
+        task_keys = {}
+        for task in tasks:
+            keys = self._response_cache_keys(section_name, context_digest, task["label"], task["task"])
+            task_keys[task["id"]] = keys
+            hit = next((self.response_cache[k] for k in keys if k in self.response_cache), None)
+            if hit is not None:
+                cached_results[task["id"]] = hit
+            else:
+                uncached_tasks.append(task)
 
-                    tasks.append({
-                        "id": str(start_idx + i),
-                        "label": self._sanitize_text(label),
-                        "task": self._sanitize_text(f.get("prompt", ""))
-                    })
+        if not uncached_tasks:
+            return cached_results
+        tasks = uncached_tasks
 
-                system_prompt = f"""You are an expert event brief extractor for the '{section_name}' section.
+        system_prompt = f"""You are an expert event brief extractor for the '{section_name}' section.
 
 TASK: Extract the EXACT requested information from the context.
 
@@ -287,107 +470,162 @@ Example:
 
 Return ONLY the JSON object with NO additional text."""
 
-                user_prompt = f"""
+        user_prompt = f"""
 CONTEXT FROM DOCUMENTS:
 {context}
 
 TASKS:
-{json.dumps(tasks, indent=2)}
+{orjson.dumps(tasks, option=orjson.OPT_INDENT_2).decode()}
 
 Return the extracted data as a JSON object:
 """
 
-                # Execute LLM Call
-                response = self.llm.invoke([
-                    ("system", system_prompt),
-                    ("human", user_prompt)
-                ])
-
-                # Safe JSON Parsing
-                content = response.content.strip()
-                try:
-                    # Remove potential markdown formatting
-                    if "```json" in content:
-                        content = content.split("```json")[1].split("```")[0].strip()
-                    elif "```" in content:
-                        content = content.split("```")[1].split("```")[0].strip()
-
-                    return json.loads(content)
-                except json.JSONDecodeError:
-                    print(f"⚠️ AI returned invalid JSON for a micro-batch. Result: {content[:100]}...")
-                    if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
-                        continue
-                    else:
-                        raise ValueError("LLM response was not valid JSON")
-
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    print(f"(failed)", end=" ")
-                    return {str(start_idx + i): "Nil" for i in range(len(fields))}
-
-    def _get_json_context(self, section_name: str) -> str:
+        # Execute LLM Call, holding a semaphore slot only for the request itself
+        async with self.llm_semaphore:
+            response = await self.llm.ainvoke([
+                ("system", system_prompt),
+                ("human", user_prompt)
+            ])
+
+        # Safe JSON Parsing
+        content = response.content.strip()
+        try:
+            # Remove potential markdown formatting
+            fence = _FENCE_RE.search(content)
+            payload = fence.group(1) if fence else content
+
+            extracted = orjson.loads(payload.encode())
+            if not isinstance(extracted, dict):
+                raise ValueError(f"LLM returned {type(extracted).__name__}, expected a JSON object")
+            for task in tasks:
+                value = extracted.get(task["id"])
+                # Only cache real answers so a miss can be retried on the next request
+                if value and value != "Nil":
+                    self._store_response(task_keys[task["id"]], value)
+            return {**cached_results, **extracted}
+        except orjson.JSONDecodeError:
+            logger.warning("⚠️ AI returned invalid JSON for a micro-batch. Result: %s...", content[:100])
+            raise
+
+    def _response_cache_keys(self, section_name: str, context_digest: str, label: str, prompt: str) -> tuple:
+        """
+        Two-tier cache keys for a single task (label and prompt are both sent to the LLM):
+        1. Exact: the label and prompt as sent
+        2. Approximate: the prompt lowercased, whitespace collapsed, trailing punctuation stripped
+        """
+        normalized = " ".join(prompt.lower().split()).rstrip(_TRAILING_PUNCT)
+        exact = hashlib.blake2b(f"{section_name}\x00{context_digest}\x00{label}\x00{prompt}".encode(), digest_size=16).hexdigest()
+        approx = hashlib.blake2b(f"{section_name}\x00{context_digest}\x00{label}\x00~{normalized}".encode(), digest_size=16).hexdigest()
+        return exact, approx
+
+    def _store_response(self, keys: tuple, value) -> None:
+        """Store an LLM answer under all cache keys, evicting the oldest entries when full"""
+        for key in keys:
+            self.response_cache[key] = value
+        while len(self.response_cache) > self.response_cache_max:
+            self.response_cache.pop(next(iter(self.response_cache)))
+
+    def _get_json_context(self, session: IngestSession, section_name: str) -> str:
         """
         For JSON files: Return relevant section(s) of the JSON
         This is more accurate than vector search for structured data
         """
-        if not self.json_content:
+        json_content = session.json_content
+        if not json_content:
             return ""
 
-        # Map section names to JSON keys - EXPANDED MAPPING
-        section_key_map = {
-            "project overview": ["project_kickoff", "basic_info", "event_details", "event","project"],
-            "project stakeholders": ["contacts", "stakeholders", "team", "people"],
-            "objectives & audience": ["objectives", "audience", "goals", "targets"],
-            "story & client experience": ["story", "experience", "message", "narrative"],
-            "historical learnings": ["historical_learnings", "historical_context", "previous_year", "history", "learnings"],
-            "agency deliverables": ["agency_deliverables", "agency_requirements", "deliverables", "blue_studio", "must_haves"],
-        }
-
         section_lower = section_name.lower()
-        relevant_keys = []
 
-        # Find matching keys
-        for section_keyword, json_keys in section_key_map.items():
-            if section_keyword in section_lower or any(k in section_lower for k in json_keys):
-                relevant_keys.extend(json_keys)
+        relevant_keys = self._section_keys(section_lower)
 
         # Extract relevant sections
         relevant_data = {}
         for key in relevant_keys:
-            if key in self.json_content:
-                relevant_data[key] = self.json_content[key]
+            if key in json_content:
+                relevant_data[key] = json_content[key]
 
         # If nothing found, return full JSON (it's small enough)
         if not relevant_data or section_lower in ["project overview","project stakeholders"]:
             # For important sections, return FULL JSON to ensure no data is missed
-            return self._json_to_text(self.json_content)
+            cache_key, subset = None, json_content
+        else:
+            cache_key, subset = tuple(relevant_data), relevant_data
 
-        # Return as formatted text (easier for LLM to read)
-        return self._json_to_text(relevant_data)
+        # Return as formatted text (easier for LLM to read), rendered once per subset
+        text = session.json_text_cache.get(cache_key)
+        if text is None:
+            text = session.json_text_cache[cache_key] = self._json_to_text(subset)
+        return text
 
-    def _get_smart_context(self, section_name: str, fields: List[Dict]) -> str:
+    def _section_keys(self, section_lower: str) -> List[str]:
+        """JSON keys for a section: every alias that appears anywhere in its name"""
+        relevant_keys = self._section_keys_cache.get(section_lower)
+        if relevant_keys is None:
+            relevant_keys = []
+            for alias, json_keys in self._section_index.items():
+                if alias in section_lower:
+                    relevant_keys.extend(k for k in json_keys if k not in relevant_keys)
+            self._section_keys_cache[section_lower] = relevant_keys
+        return relevant_keys
+
+    async def _search(self, session: IngestSession, query: str, k: int) -> List[Document]:
+        """Similarity search over this session's chunks, cached per session"""
+        cache_key = (query, k)
+        chunks = session.context_cache.get(cache_key)
+        if chunks is None:
+            # Embedding the query is CPU work, so keep it off the event loop
+            chunks = await asyncio.to_thread(
+                self.vector_db.similarity_search, query, k=k, filter=session.search_filter
+            )
+            session.context_cache[cache_key] = chunks
+        return chunks
+
+    async def _get_field_context(self, session: IngestSession, fields: List[Dict], k: int = 3) -> str:
+        """
+        Per-field vector search, deduplicated across the micro-batch.
+        Chunks are taken round-robin by rank so every field gets its best
+        matches within FIELD_CONTEXT_CHARS.
+        """
+        queries = [f"{f.get('temp_id_name', '')} {f.get('prompt', '')}" for f in fields]
+        results = await asyncio.gather(*(self._search(session, q, k) for q in queries))
+
+        all_chunks = []
+        seen_hashes = set()
+        used_chars = 0
+
+        for rank in range(k):
+            for chunks in results:
+                if rank >= len(chunks):
+                    continue
+                content = chunks[rank].page_content
+                if not content.strip() or used_chars + len(content) > FIELD_CONTEXT_CHARS:
+                    continue
+                h = hashlib.blake2b(content.encode(), digest_size=8).digest()
+                if h not in seen_hashes:
+                    seen_hashes.add(h)
+                    all_chunks.append(content)
+                    used_chars += len(content)
+
+        return "\n\n---\n\n".join(all_chunks)
+
+    async def _get_smart_context(self, session: IngestSession, section_name: str, fields: List[Dict]) -> str:
         """Vector search fallback for non-JSON files"""
         all_chunks = []
-        seen_content = set()
+        seen_hashes = set()
 
         # Get chunks for section and fields
         queries = [section_name] + [f"{f.get('temp_id_name', '')} {f.get('prompt', '')}" for f in fields]
+        results = await asyncio.gather(*(self._search(session, q, 2) for q in queries[:5]))  # Limit queries
 
-        for query in queries[:5]:  # Limit queries
-            if query in self.context_cache:
-                chunks = self.context_cache[query]
-            else:
-                chunks = self.vector_db.similarity_search(query, k=2)
-                self.context_cache[query] = chunks
-
+        for chunks in results:
             for chunk in chunks:
                 content = chunk.page_content
-                if content not in seen_content and content.strip():
+                if not content.strip():
+                    continue
+                h = hashlib.blake2b(content.encode(), digest_size=8).digest()
+                if h not in seen_hashes:
+                    seen_hashes.add(h)
                     all_chunks.append(content)
-                    seen_content.add(content)
                     if len(all_chunks) >= 6:
                         break
 
@@ -398,45 +636,51 @@ Return the extracted data as a JSON object:
 
     def _json_to_text(self, json_data, prefix: str = "") -> str:
         """Convert JSON to readable text"""
-        lines = []
+        buf = io.StringIO()
+        self._write_json_text(json_data, prefix, buf)
+        return buf.getvalue()
+
+    def _write_json_text(self, json_data, prefix: str, buf: io.StringIO) -> None:
+        """Write the readable text for json_data into buf (lines separated by newlines)"""
+        write = buf.write
 
         if isinstance(json_data, dict):
+            first = True
             for key, value in json_data.items():
+                if not first:
+                    write("\n")
+                first = False
                 readable_key = key.replace('_', ' ').replace('-', ' ').title()
 
                 if isinstance(value, dict):
-                    lines.append(f"{prefix}{readable_key}:")
+                    write(f"{prefix}{readable_key}:")
                     for sub_key, sub_value in value.items():
                         sub_readable_key = sub_key.replace('_', ' ').replace('-', ' ').title()
-                        lines.append(f"{prefix}  {sub_readable_key}: {sub_value}")
+                        write(f"\n{prefix}  {sub_readable_key}: {sub_value}")
                 elif isinstance(value, list):
-                    lines.append(f"{prefix}{readable_key}: {', '.join(str(v) for v in value)}")
+                    write(f"{prefix}{readable_key}: {', '.join(str(v) for v in value)}")
                 else:
-                    lines.append(f"{prefix}{readable_key}: {value}")
+                    write(f"{prefix}{readable_key}: {value}")
 
         elif isinstance(json_data, list):
             for i, item in enumerate(json_data, 1):
+                if i > 1:
+                    write("\n")
                 if isinstance(item, (dict, list)):
-                    lines.append(f"{prefix}Item {i}:")
-                    lines.append(self._json_to_text(item, prefix + "  "))
+                    write(f"{prefix}Item {i}:\n")
+                    self._write_json_text(item, prefix + "  ", buf)
                 else:
-                    lines.append(f"{prefix}- {item}")
+                    write(f"{prefix}- {item}")
         else:
-            return str(json_data)
-
-        return "\n".join(lines)
+            write(str(json_data))
 
     def _sanitize_text(self, text: str) -> str:
         """Sanitize text to prevent API errors - LESS AGGRESSIVE"""
         if not text:
             return ""
         # Only fix problematic characters, don't truncate aggressively
-        text = text.replace('\xa0', ' ').replace('\u2013', '-').replace('\u2014', '-')
-        text = re.sub(r'[^\x00-\x7E]+', ' ', text)
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
-        text = text.replace('', '')
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        text = text.translate(_SANITIZE_TABLE)
+        text = _NON_ASCII_RE.sub(' ', text)
         text = ' '.join(text.split())
 
         if len(text) > 2000:
@@ -444,12 +688,12 @@ Return the extracted data as a JSON object:
 
         return text
 
-    def get_stats(self) -> Dict:
-        """Get engine statistics"""
+    def get_stats(self, session: IngestSession) -> Dict:
+        """Get statistics for an ingest session"""
         return {
-            "files_processed": len(self.processed_files),
-            "files": self.processed_files,
-            "json_mode": self.json_content is not None,
-            "chunks_indexed": len(self.context_cache) if self.vector_db else 0,
-            "vector_db_ready": self.vector_db is not None
+            "files_processed": len(session.processed_files),
+            "files": session.processed_files,
+            "json_mode": session.json_content is not None,
+            "chunks_indexed": len(session.context_cache) if session.index_ready else 0,
+            "vector_db_ready": session.index_ready
         }
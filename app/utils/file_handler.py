@@ -1,26 +1,39 @@
 import os
+import uuid
 import shutil
+import aiofiles
 from fastapi import UploadFile
 
 # Use the 'uploads' folder seen in your root directory
 UPLOAD_DIR = "uploads"
+# Read uploads in 1 MiB chunks so memory use stays flat regardless of file size
+CHUNK_SIZE = 1 << 20
 
-def save_temp_file(upload_file: UploadFile) -> str:
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR)
+def create_request_dir() -> str:
+    """Creates a per-request subfolder so parallel requests don't collide on cleanup."""
+    request_dir = os.path.join(UPLOAD_DIR, uuid.uuid4().hex)
+    os.makedirs(request_dir, exist_ok=True)
+    return request_dir
+
+def _safe_filename(filename) -> str:
+    """Strips any client-supplied directory parts so the file can't land outside its folder."""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    return name if name not in ("", ".", "..") else "upload"
+
+async def save_temp_file(upload_file: UploadFile, dest_dir: str = UPLOAD_DIR) -> str:
+    # Each file gets its own subfolder so same-named uploads saved concurrently
+    # never write to one path, while the original filename (and extension) is kept
+    file_dir = os.path.join(dest_dir, uuid.uuid4().hex)
+    os.makedirs(file_dir, exist_ok=True)
     
-    file_path = os.path.join(UPLOAD_DIR, upload_file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+    file_path = os.path.join(file_dir, _safe_filename(upload_file.filename))
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await upload_file.read(CHUNK_SIZE):
+            await buffer.write(chunk)
     return file_path
 
-def cleanup_uploads():
-    """Removes all files in the uploads folder after processing."""
-    if os.path.exists(UPLOAD_DIR):
-        for filename in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-            except Exception as e:
-                print(f"Error cleaning up file {file_path}: {e}")
\ No newline at end of file
+def cleanup_uploads(dest_dir: str = UPLOAD_DIR):
+    """Removes the uploads folder (or a single request subfolder) after processing."""
+    shutil.rmtree(dest_dir, ignore_errors=True)
+    if dest_dir == UPLOAD_DIR:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)